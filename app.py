@@ -1,62 +1,219 @@
 # app.py
 # app.py
 import os
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+import hmac
+import time
+import hashlib
+import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, EmailStr, HttpUrl
 from dotenv import load_dotenv
 from solver import solve_quiz
+import llmgenerator
 
 load_dotenv()
 
 QUIZ_SECRET = os.getenv("QUIZ_SECRET")
+_SECRET_B = (QUIZ_SECRET or "").encode()
+
+class ConcurrentRequestLimiterMiddleware:
+    """Shed load with an immediate 503 once max_concurrent requests are in flight.
+
+    Keeps tail latency bounded under overload instead of letting uvicorn
+    queue requests behind long-running solve chains.
+    """
+
+    def __init__(self, app, max_concurrent: int = 32):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self._in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self._in_flight >= self.max_concurrent:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]
+            })
+            await send({"type": "http.response.body", "body": b'{"error": "Server busy"}'})
+            return
+
+        self._in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight -= 1
+
+
+def _chain_completed(body: bytes) -> bool:
+    try:
+        return orjson.loads(body).get("result") == "chain_completed"
+    except Exception:
+        return False
+
+
+class ResponseCacheMiddleware:
+    """Cache completed /quiz responses keyed on a hash of the request body.
+
+    Retries/polls with the identical (email, secret, url) payload get the
+    cached response instead of re-running the whole LLM solve chain.
+    """
+
+    def __init__(self, app, max_entries: int = 1024, ttl: float = 300.0):
+        self.app = app
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/quiz":
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the request body so it can be hashed and replayed downstream
+        chunks = []
+        more = True
+        while more:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+        key = hashlib.blake2b(body).hexdigest()
+
+        hit = self._cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            _, status, headers, resp_body = hit
+            # Build fresh message dicts per replay: outer middleware (gzip)
+            # mutates start messages in place
+            await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+            await send({"type": "http.response.body", "body": resp_body})
+            return
+
+        async def replay():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        captured = {"status": None, "headers": [], "body": b""}
+
+        async def record(message):
+            if message["type"] == "http.response.start":
+                # Copy status/headers before send(): gzip rewrites the
+                # message's headers in place on its way out
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured["body"] += message.get("body", b"")
+            await send(message)
+
+        await self.app(scope, replay, record)
+
+        # Cache only fully completed chains: solve_quiz answers 200 even for
+        # chain_with_errors, and failed chains should be allowed to retry
+        if captured["status"] == 200 and _chain_completed(captured["body"]):
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[key] = (
+                time.monotonic() + self.ttl,
+                captured["status"],
+                captured["headers"],
+                captured["body"]
+            )
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Fail fast at boot instead of re-checking env on every request;
+    # lets the platform mark the instance unhealthy immediately
+    if not QUIZ_SECRET:
+        raise RuntimeError("QUIZ_SECRET not set")
+    if not llmgenerator.AIPIPE_TOKEN or not llmgenerator.AIPIPE_URL:
+        raise RuntimeError("AIPIPE_TOKEN or AIPIPE_URL not set")
+    asyncio.create_task(llmgenerator.warmup())
+    yield
+    await llmgenerator.aclose()
 
-app = FastAPI()
 
+# orjson serializes responses several times faster than stdlib json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(ResponseCacheMiddleware)
+# Chained step logs can run to tens of KB; gzip anything above 1 KB
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+# Outermost: reject excess load before it touches anything else
+app.add_middleware(
+    ConcurrentRequestLimiterMiddleware,
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_REQUESTS", "32"))
+)
 
-@app.post("/quiz")
-async def quiz_endpoint(request: Request):
-    # Ensure environment secret is set
-    if not QUIZ_SECRET:
-        return JSONResponse(
-            status_code=500,
-            content={"error": "Server misconfigured: QUIZ_SECRET not set"}
-        )
 
-    # Parse incoming JSON
-    try:
-        data = await request.json()
-    except Exception:
-        return JSONResponse(status_code=400, content={"error": "Invalid JSON payload"})
+class QuizRequest(BaseModel):
+    email: EmailStr
+    secret: str
+    url: HttpUrl
+
 
-    email = data.get("email")
-    secret = data.get("secret")
-    url = data.get("url")
+# Error bodies are constants: render them once at import and reuse the
+# same Response objects instead of re-encoding JSON on every reject
+_ERR_BAD_SECRET = ORJSONResponse(status_code=403, content={"error": "Invalid secret"})
 
-    # Validate request fields
-    if not email:
-        return JSONResponse(status_code=400, content={"error": "Email missing"})
-    if not secret:
-        return JSONResponse(status_code=400, content={"error": "Secret missing"})
-    if not url:
-        return JSONResponse(status_code=400, content={"error": "URL missing"})
 
-    # Validate provided secret against QUIZ_SECRET from env
-    if secret != QUIZ_SECRET:
-        return JSONResponse(status_code=403, content={"error": "Invalid secret"})
+class StaticResponseError(Exception):
+    """Carries a pre-rendered Response out of a dependency."""
 
+    def __init__(self, response):
+        self.response = response
+
+
+@app.exception_handler(StaticResponseError)
+async def _static_response_handler(request, exc):
+    return exc.response
+
+
+async def verify_secret(body: QuizRequest) -> QuizRequest:
+    # Validate provided secret against QUIZ_SECRET from env (constant-time)
+    if not hmac.compare_digest(body.secret.encode(), _SECRET_B):
+        raise StaticResponseError(_ERR_BAD_SECRET)
+    return body
+
+
+# response_model=None: the result dict goes straight to ORJSONResponse,
+# skipping FastAPI's response-model validation/serialization pass
+@app.post("/quiz", response_class=ORJSONResponse, response_model=None)
+async def quiz_endpoint(body: QuizRequest = Depends(verify_secret)):
     # Solve quiz chain (solver will handle submissions and chaining)
     try:
-        result = await solve_quiz(email=email, secret=secret, url=url, required_min_steps=3)
+        result = await solve_quiz(email=body.email, secret=body.secret, url=str(body.url), required_min_steps=3)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Solve failed: {e}"})
+        return ORJSONResponse(status_code=500, content={"error": f"Solve failed: {e}"})
 
-    return JSONResponse(status_code=200, content=result)
+    return ORJSONResponse(result)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
-
+    # Import string + workers so every core serves requests; uvloop/httptools
+    # replace the default asyncio loop and h11 parser
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        # Skip the per-request access-log line and Server/Date headers;
+        # both are pure overhead on the cheap reject paths
+        access_log=False,
+        log_level="warning",
+        server_header=False,
+        date_header=False,
+        timeout_keep_alive=30
+    )
 
 
 
@@ -1,79 +1,151 @@
-# check_codeword_test.py
-#!/usr/bin/env python3
-# check_codeword_test.py
-#!/usr/bin/env python3
-import os
-import httpx
-from dotenv import load_dotenv
-
-load_dotenv()
-
-AIPIPE_TOKEN = os.getenv("AIPIPE_TOKEN")
-AIPIPE_URL = os.getenv("AIPIPE_URL")
-
-if not AIPIPE_TOKEN or not AIPIPE_URL:
-    raise Exception("Set AIPIPE_TOKEN and AIPIPE_URL in environment")
-
-system_prompt = "You are a helpful assistant."
-user_prompt = "Please answer succinctly."
-
-headers = {
-    "Authorization": f"Bearer {AIPIPE_TOKEN}",
-    "Content-Type": "application/json"
-}
-
-payload = {
-    "model": "openai/gpt-4.1-nano",
-    "max_tokens": 500,
-    "messages": [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt},
-    ]
-}
-
-with httpx.Client() as client:
-    r = client.post(AIPIPE_URL, json=payload, headers=headers)
-
-print("status:", r.status_code)
-print("response:", r.json())
-
-
-
-
-
-
-
-# import os
-# import httpx
-# from dotenv import load_dotenv
-
-# load_dotenv()
-
-# AIPIPE_TOKEN = os.getenv("AIPIPE_TOKEN")
-# AIPIPE_URL = os.getenv("AIPIPE_URL")
-
-# if not AIPIPE_TOKEN or not AIPIPE_URL:
-#     raise Exception("Set AIPIPE_TOKEN and AIPIPE_URL in environment")
-
-# system_prompt = "You are a helpful assistant."
-# user_prompt = "Please answer succinctly."
-
-# headers = {
-#     "Authorization": f"Bearer {AIPIPE_TOKEN}",
-#     "Content-Type": "application/json"
-# }
-
-# payload = {
-#     "model": "openai/gpt-4.1-nano",
-#     "max_tokens": 500,
-#     "messages": [
-#         {"role": "system", "content": system_prompt},
-#         {"role": "user", "content": user_prompt},
-#     ]
-# }
-
-# with httpx.Client() as client:
-#     r = client.post(AIPIPE_URL, json=payload, headers=headers)
-
-# print("status:", r.status_code)
-# print("response:", r.json())
+# llmgenerator.py
+#!/usr/bin/env python3
+import os
+import atexit
+import asyncio
+import httpx
+import orjson
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AIPIPE_TOKEN = os.getenv("AIPIPE_TOKEN")
+AIPIPE_URL = os.getenv("AIPIPE_URL")
+
+# Shared client created once at import: keep-alive pooling + HTTP/2 means
+# repeated LLM calls skip the TCP+TLS handshake instead of paying it per call.
+# The transport retries once so connections silently dropped by idle LB
+# timeouts get re-established transparently.
+_LIMITS = httpx.Limits(
+    max_keepalive_connections=20,
+    max_connections=100,
+    keepalive_expiry=30.0
+)
+_CLIENT = httpx.AsyncClient(
+    base_url=AIPIPE_URL or "",
+    headers={"Authorization": f"Bearer {AIPIPE_TOKEN}"},
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    transport=httpx.AsyncHTTPTransport(retries=1, http2=True, limits=_LIMITS)
+)
+
+
+def shared_client() -> httpx.AsyncClient:
+    """Process-wide LLM client: warmed at startup, closed via aclose()."""
+    return _CLIENT
+
+
+async def warmup():
+    # Pre-open a pooled connection at startup so the first real LLM call
+    # does not pay the cold TLS handshake
+    try:
+        await _CLIENT.get("/models", timeout=5.0)
+    except Exception:
+        pass
+
+
+# Bound concurrent outbound LLM calls so a burst of /quiz requests cannot
+# starve the connection pool (sized well under max_connections above).
+# Public: solver wraps its AIPipe calls in this same gate.
+LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "16")))
+
+# Fixed payload fields built once; generate() only fills in the messages
+_BASE_PAYLOAD = {
+    "model": "openai/gpt-4.1-nano",
+    "max_tokens": 500
+}
+
+
+async def generate(system_prompt: str, user_prompt: str,
+                   model: str = None, max_tokens: int = None) -> dict:
+    """Run one LLM completion on the shared AsyncClient and return the raw response dict."""
+    if not AIPIPE_TOKEN or not AIPIPE_URL:
+        raise Exception("Set AIPIPE_TOKEN and AIPIPE_URL in environment")
+
+    payload = {
+        **_BASE_PAYLOAD,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+    }
+    if model is not None:
+        payload["model"] = model
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+
+    # orjson on both sides: encode the payload and parse the raw bytes,
+    # skipping httpx's stdlib-json fallback and the extra utf-8 decode.
+    # Post to the absolute AIPIPE_URL: a relative "" resolves against the
+    # base_url with a trailing slash appended, which is a different path.
+    async with LLM_SEM:
+        r = await _CLIENT.post(
+            AIPIPE_URL,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+
+async def aclose():
+    await _CLIENT.aclose()
+
+
+def _close_client_at_exit():
+    # Best-effort close when used as a script; FastAPI shutdown should await aclose()
+    try:
+        asyncio.run(_CLIENT.aclose())
+    except Exception:
+        pass
+
+
+atexit.register(_close_client_at_exit)
+
+
+if __name__ == "__main__":
+    async def main():
+        data = await generate("You are a helpful assistant.", "Please answer succinctly.")
+        print("response:", data)
+
+    asyncio.run(main())
+
+
+
+
+
+
+
+# import os
+# import httpx
+# from dotenv import load_dotenv
+
+# load_dotenv()
+
+# AIPIPE_TOKEN = os.getenv("AIPIPE_TOKEN")
+# AIPIPE_URL = os.getenv("AIPIPE_URL")
+
+# if not AIPIPE_TOKEN or not AIPIPE_URL:
+#     raise Exception("Set AIPIPE_TOKEN and AIPIPE_URL in environment")
+
+# system_prompt = "You are a helpful assistant."
+# user_prompt = "Please answer succinctly."
+
+# headers = {
+#     "Authorization": f"Bearer {AIPIPE_TOKEN}",
+#     "Content-Type": "application/json"
+# }
+
+# payload = {
+#     "model": "openai/gpt-4.1-nano",
+#     "max_tokens": 500,
+#     "messages": [
+#         {"role": "system", "content": system_prompt},
+#         {"role": "user", "content": user_prompt},
+#     ]
+# }
+
+# with httpx.Client() as client:
+#     r = client.post(AIPIPE_URL, json=payload, headers=headers)
+
+# print("status:", r.status_code)
+# print("response:", r.json())
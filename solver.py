@@ -3,16 +3,50 @@ import os
 import io
 import re
 import json
+import time
 import asyncio
 import base64
+import hashlib
 from typing import Optional, Any, Dict, List
+from collections import OrderedDict
 from urllib.parse import urljoin
 
 import httpx
+import numpy as np
+import orjson
 import pandas as pd
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+import llmgenerator
+
+try:
+    # Optional: C-based parser, roughly an order of magnitude faster than
+    # bs4's html.parser on the page sizes we see
+    from selectolax.parser import HTMLParser as _SelectolaxParser
+except ImportError:
+    _SelectolaxParser = None
+
+try:
+    import tiktoken
+    _TIKTOKEN_ENC = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _TIKTOKEN_ENC = None
+
+try:
+    # Optional: Arrow's C++ CSV reader is several times faster than pandas'
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+try:
+    import python_calamine  # noqa: F401  (fast Rust Excel reader for pandas)
+    _EXCEL_ENGINE = "calamine"
+except ImportError:
+    _EXCEL_ENGINE = None
+
 load_dotenv()
 
 # ---------------------------
@@ -28,33 +62,83 @@ ANALYSIS_SUBMIT_URL = os.getenv(
 
 DEFAULT_HTTP_TIMEOUT = 30.0
 MAX_CHAIN_STEPS = int(os.getenv("MAX_CHAIN_STEPS", "10"))
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "2000"))
+STEP_CONCURRENCY = int(os.getenv("STEP_CONCURRENCY", "4"))
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+
+# Boilerplate elements that carry no quiz signal but cost prompt tokens
+_NOISE_TAGS = ["script", "style", "nav", "footer", "header"]
+
+_DATA_EXT_SET = {"csv", "xls", "xlsx"}
+
+
+def _is_data_href(href: str) -> bool:
+    # Lowercase only the split-off extension so DATA.CSV etc. still match
+    return href.rsplit(".", 1)[-1].lower() in _DATA_EXT_SET
+
+
+# ---------------------------
+# COMPILED REGEXES
+# ---------------------------
+# Bound once at import so hot paths skip re's cache lookup + pattern parse
+
+# tds{...} gets its own pre-pass: folded into the alternation below, the
+# token branch can swallow a glued prefix ("token_tds{x}") and the
+# non-overlapping scan then never sees the tds{ start
+_RE_TDS = re.compile(r"tds\{[^}]+\}", re.IGNORECASE)
+# One alternation so the token/labeled fallbacks scan the page text once
+_RE_SECRET_ANY = re.compile(
+    r"\b([A-Za-z0-9_\-]{6,})\b|secret[:\s]*([A-Za-z0-9_\-{}]{4,})",
+    re.IGNORECASE
+)
+_RE_WS = re.compile(r"\n\s*\n\s*")
+
+_JSON_DECODER = json.JSONDecoder()
 
 
 # ---------------------------
 # NORMALIZATION HELPERS
 # ---------------------------
 
+def _extract_first_json(s: str):
+    """Linear scan for the first parseable JSON object; O(n) vs greedy-regex backtracking."""
+    i = s.find("{")
+    while i != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(s, i)
+            return obj
+        except json.JSONDecodeError:
+            i = s.find("{", i + 1)
+    return None
+
 def _attempt_json_parse(value: str):
     try:
-        return json.loads(value)
+        return orjson.loads(value)
     except Exception:
         return None
 
+_TRUE_WORDS = frozenset({"true", "yes", "y"})
+_FALSE_WORDS = frozenset({"false", "no", "n"})
+
 def _attempt_number(value: str):
-    try:
-        if re.fullmatch(r"-?\d+", value.strip()):
-            return int(value.strip())
-        if re.fullmatch(r"-?\d+\.\d+", value.strip()):
-            return float(value.strip())
-    except Exception:
+    s = value.strip()
+    # Cheap first-char guard: rule out non-numbers before paying for int()
+    c = s[:1]
+    if not (c.isdigit() or (c == "-" and s[1:2].isdigit())):
         return None
-    return None
+    try:
+        return int(s)
+    except ValueError:
+        try:
+            return float(s)
+        except ValueError:
+            return None
 
 def _attempt_boolean(value: str):
     v = value.strip().lower()
-    if v in ["true", "yes", "y"]:
+    if v in _TRUE_WORDS:
         return True
-    if v in ["false", "no", "n"]:
+    if v in _FALSE_WORDS:
         return False
     return None
 
@@ -65,7 +149,7 @@ def _flatten_answer_object(obj: dict):
         if isinstance(v, (str, int, float, bool)):
             return v
         try:
-            return json.dumps(v)
+            return orjson.dumps(v).decode()
         except Exception:
             return str(v)
 
@@ -78,6 +162,46 @@ def _flatten_answer_object(obj: dict):
             cleaned[k] = str(v)
     return cleaned
 
+def _normalize_str(answer: str):
+    s = answer.strip()
+
+    # 1) boolean
+    b = _attempt_boolean(s)
+    if b is not None:
+        return b
+
+    # 2) number
+    n = _attempt_number(s)
+    if n is not None:
+        return n
+
+    # 3) JSON
+    j = _attempt_json_parse(s)
+    if j is not None:
+        if isinstance(j, dict):
+            return _flatten_answer_object(j)
+        return j
+
+    # 4) base64 URI
+    if s.startswith("data:") and ";base64," in s:
+        return s
+
+    # 5) fallback simple string
+    return s
+
+def _passthrough(answer):
+    return answer
+
+# Exact-type dispatch: one dict lookup instead of an isinstance cascade
+# (and type(True) is bool, so bool no longer shadows int)
+_NORMALIZERS = {
+    bool: _passthrough,
+    int: _passthrough,
+    float: _passthrough,
+    str: _normalize_str,
+    dict: _flatten_answer_object,
+}
+
 def _normalize_answer_for_submission(answer: Any) -> Any:
     """
     Produce ONLY one of the types allowed by the grader:
@@ -86,38 +210,9 @@ def _normalize_answer_for_submission(answer: Any) -> Any:
     - string
     - dict (simple keys only)
     """
-    if isinstance(answer, (int, float, bool)):
-        return answer
-
-    if isinstance(answer, dict):
-        return _flatten_answer_object(answer)
-
-    if isinstance(answer, str):
-        s = answer.strip()
-
-        # 1) boolean
-        b = _attempt_boolean(s)
-        if b is not None:
-            return b
-
-        # 2) number
-        n = _attempt_number(s)
-        if n is not None:
-            return n
-
-        # 3) JSON
-        j = _attempt_json_parse(s)
-        if j is not None:
-            if isinstance(j, dict):
-                return _flatten_answer_object(j)
-            return j
-
-        # 4) base64 URI
-        if s.startswith("data:") and ";base64," in s:
-            return s
-
-        # 5) fallback simple string
-        return s
+    fn = _NORMALIZERS.get(type(answer))
+    if fn is not None:
+        return fn(answer)
 
     # fallback convert to string
     try:
@@ -130,54 +225,155 @@ def _normalize_answer_for_submission(answer: Any) -> Any:
 # HTTP & SCRAPING HELPERS
 # ---------------------------
 
-async def _fetch_text(url: str, client: httpx.AsyncClient, timeout: float = DEFAULT_HTTP_TIMEOUT) -> str:
+def _json_or_raw(resp: httpx.Response):
+    """Parse the response body bytes with orjson (no str decode); fall back to raw text."""
+    try:
+        return orjson.loads(resp.content)
+    except orjson.JSONDecodeError:
+        return {"raw": resp.text}
+
+def _parse_html(html: str):
+    """Extract (visible text, data-file hrefs) with selectolax when available, bs4 otherwise."""
+    if _SelectolaxParser is not None:
+        tree = _SelectolaxParser(html)
+        # CSS suffix selectors match case-sensitively, so filter extensions
+        # in Python with the same check as the bs4 path
+        hrefs = [n.attributes.get("href") for n in tree.css("a[href]")]
+        tree.strip_tags(_NOISE_TAGS)
+        text = tree.body.text(separator="\n") if tree.body else ""
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+        for tag in soup(_NOISE_TAGS):
+            tag.decompose()
+        text = soup.get_text("\n")
+    text = _RE_WS.sub("\n\n", text).strip()
+    return text, [h for h in hrefs if h and _is_data_href(h)]
+
+
+def _cap_tokens(text: str, max_tokens: int = MAX_PROMPT_TOKENS) -> str:
+    """Truncate by token count when tiktoken is available, else by characters."""
+    if _TIKTOKEN_ENC is not None:
+        ids = _TIKTOKEN_ENC.encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        return _TIKTOKEN_ENC.decode(ids[:max_tokens])
+    return text[:15000]
+
+
+async def _fetch_html(url: str, client: httpx.AsyncClient, timeout: float = DEFAULT_HTTP_TIMEOUT):
+    """Fetch URL with a single GET and return (visible text, data-file hrefs).
+
+    Both values come out of one parse of the same body — callers must not
+    re-fetch or re-parse the page for link scanning.
+    """
     resp = await client.get(url, timeout=timeout)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    text = soup.get_text("\n")
-    text = re.sub(r"\n\s*\n\s*", "\n\n", text).strip()
-    return text
+    # Parse off the event loop so other pending steps keep making progress
+    return await asyncio.to_thread(_parse_html, resp.text)
+
+# Chains often point back at the same asset; remember processed results
+# so revisits skip the download and the parse (small LRU, newest last)
+_FILE_CACHE: OrderedDict = OrderedDict()
+_FILE_CACHE_MAX = 32
+
+
+def _remember_file_result(key, result):
+    if len(_FILE_CACHE) >= _FILE_CACHE_MAX:
+        _FILE_CACHE.popitem(last=False)
+    _FILE_CACHE[key] = result
+    return result
+
 
 async def _download_and_process_file(file_url: str, client: httpx.AsyncClient, context_text: str) -> Any:
+    want_sum = "sum" in (context_text or "").lower()
+
+    # The result depends on the sum hint as well as the URL
+    key = (file_url, want_sum)
+    if key in _FILE_CACHE:
+        _FILE_CACHE.move_to_end(key)
+        return _FILE_CACHE[key]
+
+    # Preflight with HEAD: bail to the LLM path rather than buffering an
+    # arbitrarily large file just to sum one column
+    try:
+        head = await client.head(file_url, timeout=5.0)
+        size = int(head.headers.get("content-length", "0"))
+    except Exception:
+        size = 0
+    if size > MAX_FILE_BYTES:
+        raise Exception(f"file too large for heuristic ({size} bytes)")
+
     resp = await client.get(file_url, timeout=DEFAULT_HTTP_TIMEOUT)
     resp.raise_for_status()
     content = resp.content
 
+    # Parsing is synchronous CPU work: run it in a thread, and feed the raw
+    # bytes directly (the readers decode them themselves)
     if file_url.lower().endswith(".csv"):
-        df = pd.read_csv(io.StringIO(content.decode()))
+        if pa is not None:
+            table = await asyncio.to_thread(pacsv.read_csv, io.BytesIO(content))
+            if want_sum:
+                # Sum inside Arrow; no pandas frame needed
+                for name in table.column_names:
+                    col = table[name]
+                    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+                        return _remember_file_result(key, int(pc.sum(col).as_py()))
+            return _remember_file_result(key, table.to_pylist())
+        df = await asyncio.to_thread(pd.read_csv, io.BytesIO(content))
     elif file_url.lower().endswith((".xls", ".xlsx")):
-        df = pd.read_excel(io.BytesIO(content))
+        df = await asyncio.to_thread(pd.read_excel, io.BytesIO(content), engine=_EXCEL_ENGINE)
     else:
         raise Exception("Unsupported file type for heuristic")
 
-    # If page hints "sum", apply heuristic
-    if "sum" in (context_text or "").lower():
-        num_cols = df.select_dtypes("number").columns
-        if len(num_cols) > 0:
-            return int(df[num_cols[0]].sum())
+    # If page hints "sum", apply heuristic — reduce over the raw NumPy
+    # buffer instead of going through pandas' Series.sum dispatch
+    if want_sum:
+        numeric = df.select_dtypes("number")
+        if numeric.shape[1] > 0:
+            arr = numeric.iloc[:, 0].to_numpy()
+            # nansum: pandas .sum() skips NaN, plain reduce would propagate it
+            return _remember_file_result(key, int(np.nansum(arr)))
 
-    return df.to_dict("records")
+    return _remember_file_result(key, df.to_dict("records"))
 
 def _extract_secret_from_text(text: str) -> Optional[str]:
     if not text:
         return None
 
-    # tds{...}
-    m = re.search(r"(tds\{[^}]+\})", text, re.IGNORECASE)
+    # tds{...} wins outright, checked in its own pass (see _RE_TDS)
+    m = _RE_TDS.search(text)
     if m:
-        return m.group(1)
+        return m.group(0)
 
-    # 6+ alphanumeric
-    m = re.search(r"\b([A-Za-z0-9_\-]{6,})\b", text)
-    if m:
-        return m.group(1)
+    # Single pass for the fallbacks; remember the first hit per pattern
+    first_token = None
+    first_labeled = None
+    for m in _RE_SECRET_ANY.finditer(text):
+        if first_token is None and m.group(1):
+            first_token = m.group(1)
+        if first_labeled is None and m.group(2):
+            first_labeled = m.group(2)
+        if first_token and first_labeled:
+            break
 
-    # "secret: XXXX"
-    m = re.search(r"secret[:\s]*([A-Za-z0-9_\-{}]{4,})", text, re.IGNORECASE)
-    if m:
-        return m.group(1)
+    return first_token or first_labeled
 
-    return None
+
+# ---------------------------
+# LLM CACHE
+# ---------------------------
+# temperature=0 makes identical prompts deterministic, so exact-key caching
+# is safe: repeated pages/retries skip the whole LLM roundtrip
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+_LLM_CACHE_MAX = 512
+_LLM_CACHE: Dict[str, Any] = {}
+_LLM_CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+def _llm_cache_key(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
 
 # ---------------------------
@@ -200,33 +396,56 @@ async def _call_aipipe(messages: List[Dict[str, str]]) -> str:
         "max_tokens": 1000
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(AIPIPE_URL, json=payload, headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
-        choices = data.get("choices", [])
-        if not choices:
-            return ""
-        return choices[0]["message"]["content"]
+    key = _llm_cache_key(payload)
+    cached = _LLM_CACHE.get(key)
+    if cached and time.time() - cached["ts"] < LLM_CACHE_TTL:
+        _LLM_CACHE_STATS["hits"] += 1
+        return cached["content"]
+    _LLM_CACHE_STATS["misses"] += 1
+
+    # Post on llmgenerator's shared client: its pool is warmed at startup
+    # and outlives the per-request chain client, so LLM calls keep riding
+    # the same connections across /quiz requests. The process-wide
+    # semaphore bounds total outbound LLM fan-out.
+    async with llmgenerator.LLM_SEM:
+        resp = await llmgenerator.shared_client().post(
+            AIPIPE_URL, json=payload, headers=headers, timeout=60.0
+        )
+    resp.raise_for_status()
+    data = _json_or_raw(resp)
+    try:
+        content = data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return ""
 
+    if len(_LLM_CACHE) >= _LLM_CACHE_MAX:
+        _LLM_CACHE.clear()
+    _LLM_CACHE[key] = {"content": content, "ts": time.time()}
+    return content
 
-async def _solve_page_with_llm(page_url: str, page_text: str) -> Any:
-    system_prompt = "You are a helpful assistant that outputs a JSON with 'answer' and 'explanation'."
-    user_prompt = f"""
-URL: {page_url}
+
+# Prompt parts are constant; only the URL and page text get spliced in
+_SYSTEM_PROMPT = "You are a helpful assistant that outputs a JSON with 'answer' and 'explanation'."
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+_USER_PROMPT_TMPL = """
+URL: %s
 
 Page content:
-{page_text[:15000]}
+%s
 
 Return ONLY JSON:
-{{
+{
   "answer": "<value>",
   "explanation": "<short reasoning>"
-}}
+}
 """
 
+
+async def _solve_page_with_llm(page_url: str, page_text: str) -> Any:
+    user_prompt = _USER_PROMPT_TMPL % (page_url, _cap_tokens(page_text))
+
     assistant_output = await _call_aipipe([
-        {"role": "system", "content": system_prompt},
+        _SYSTEM_MESSAGE,
         {"role": "user", "content": user_prompt}
     ])
 
@@ -234,15 +453,10 @@ Return ONLY JSON:
 
     # try parse JSON
     try:
-        return json.loads(assistant_output)
+        return orjson.loads(assistant_output)
     except Exception:
-        m = re.search(r"(\{[\s\S]*\})", assistant_output)
-        if m:
-            try:
-                return json.loads(m.group(1))
-            except Exception:
-                pass
-        return assistant_output
+        obj = _extract_first_json(assistant_output)
+        return obj if obj is not None else assistant_output
 
 
 # ---------------------------
@@ -259,18 +473,30 @@ async def _submit_to_analysis(email: str, secret: str, url: str, answer: Any, cl
         "answer": final_ans
     }
 
-    resp = await client.post(ANALYSIS_SUBMIT_URL, json=payload, timeout=DEFAULT_HTTP_TIMEOUT)
+    # Encode with orjson rather than httpx's stdlib-json default
+    resp = await client.post(
+        ANALYSIS_SUBMIT_URL,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=DEFAULT_HTTP_TIMEOUT
+    )
 
-    try:
-        parsed = resp.json()
-    except Exception:
-        parsed = {"raw": resp.text}
+    parsed = _json_or_raw(resp)
+
+    # Only throttle when the server asks for it
+    retry_after = 0.0
+    if resp.status_code == 429:
+        try:
+            retry_after = float(resp.headers.get("Retry-After", "1"))
+        except ValueError:
+            retry_after = 1.0
 
     return {
         "status_code": resp.status_code,
         "parsed": parsed,
         "raw_text": resp.text,
-        "submitted_answer": final_ans
+        "submitted_answer": final_ans,
+        "retry_after": retry_after
     }
 
 
@@ -278,104 +504,156 @@ async def _submit_to_analysis(email: str, secret: str, url: str, answer: Any, cl
 # MAIN MULTI-STEP CHAIN SOLVER
 # ---------------------------
 
-async def solve_quiz(email: str, secret: str, url: str, required_min_steps: int = 3, max_steps: int = MAX_CHAIN_STEPS) -> Dict[str, Any]:
-    steps: List[Dict[str, Any]] = []
-    current_url = url
-    step_no = 0
-
-    async with httpx.AsyncClient(timeout=DEFAULT_HTTP_TIMEOUT) as client:
-        while current_url and step_no < max_steps:
-            step_no += 1
-            record = {"step": step_no, "url": current_url}
-
-            try:
-                # 1) Fetch page text
-                page_text = await _fetch_text(current_url, client)
-
-                # 2) Detect downloadable file links
-                resp2 = await client.get(current_url)
-                soup = BeautifulSoup(resp2.text, "html.parser")
-
-                file_link = None
-                for a in soup.find_all("a", href=True):
-                    href = a["href"].strip()
-                    if href.lower().endswith((".csv", ".xls", ".xlsx")):
-                        file_link = href if href.startswith("http") else urljoin(current_url, href)
-                        break
-
-                # 3) Candidate answer
-                answer = None
+async def _do_step(url: str, step_no: int, email: str, secret: str,
+                   client: httpx.AsyncClient, sem: asyncio.Semaphore) -> Dict[str, Any]:
+    """Solve and submit one quiz page; the record carries next_url (or error)."""
+    record: Dict[str, Any] = {"step": step_no, "url": url}
 
-                # 3A) If file exists → heuristic
-                if file_link:
-                    try:
-                        record["method"] = "file_heuristic"
-                        answer = await _download_and_process_file(file_link, client, page_text)
-                    except Exception as e:
-                        record["file_error"] = str(e)
-                        answer = None
-
-                # 3B) If no answer → try secret extraction
-                if answer is None:
-                    extracted = _extract_secret_from_text(page_text)
-                    if extracted:
-                        answer = extracted
-                        record["method"] = "extracted_secret"
-
-                # 3C) Otherwise → LLM
-                if answer is None:
-                    record["method"] = "aipipe"
-                    answer = await _solve_page_with_llm(current_url, page_text)
-
-                record["raw_answer"] = answer
-
-                # 4) Submit answer
-                submit_res = await _submit_to_analysis(
-                    email=email,
-                    secret=secret,
-                    url=current_url,
-                    answer=answer,
-                    client=client
+    async with sem:
+        try:
+            # 1) Fetch page once; text and link scan share the same parse
+            page_text, data_hrefs = await _fetch_html(url, client)
+
+            # 2) First data-file link, if any (extension filter already applied)
+            file_link = None
+            if data_hrefs:
+                href = data_hrefs[0].strip()
+                file_link = href if href.startswith("http") else urljoin(url, href)
+
+            # 3) Candidate answer
+            answer = None
+            llm_res = None
+
+            # 3A) If file exists → heuristic, with the LLM fallback started
+            # concurrently so a failed heuristic costs no extra latency
+            if file_link:
+                record["method"] = "file_heuristic"
+                file_res, llm_res = await asyncio.gather(
+                    _download_and_process_file(file_link, client, page_text),
+                    _solve_page_with_llm(url, page_text),
+                    return_exceptions=True
                 )
+                if not isinstance(file_res, Exception):
+                    answer = file_res
+                else:
+                    record["file_error"] = str(file_res)
+
+            # 3B) If no answer → try secret extraction
+            if answer is None:
+                extracted = _extract_secret_from_text(page_text)
+                if extracted:
+                    answer = extracted
+                    record["method"] = "extracted_secret"
+
+            # 3C) Otherwise → LLM (reuse the speculative result if we have one)
+            if answer is None:
+                record["method"] = "aipipe"
+                if llm_res is not None:
+                    if isinstance(llm_res, Exception):
+                        raise llm_res
+                    answer = llm_res
+                else:
+                    answer = await _solve_page_with_llm(url, page_text)
+
+            record["raw_answer"] = answer
+
+            # 4) Submit answer
+            submit_res = await _submit_to_analysis(
+                email=email,
+                secret=secret,
+                url=url,
+                answer=answer,
+                client=client
+            )
+
+            record["submit_status"] = submit_res["status_code"]
+            record["submitted_answer"] = submit_res["submitted_answer"]
+            record["submit_parsed"] = submit_res["parsed"]
+            record["retry_after"] = submit_res["retry_after"]
+
+            # 5) Next URL? (a single url, or a list to fan out over)
+            parsed = submit_res["parsed"]
+            next_url = None
+
+            if isinstance(parsed, dict):
+                next_url = parsed.get("url") or parsed.get("urls")
+
+                # If nested JSON in a string
+                if isinstance(next_url, str) and next_url.startswith("{"):
+                    try:
+                        nested = orjson.loads(next_url)
+                        next_url = nested.get("url")
+                    except Exception:
+                        pass
 
-                record["submit_status"] = submit_res["status_code"]
-                record["submitted_answer"] = submit_res["submitted_answer"]
-                record["submit_parsed"] = submit_res["parsed"]
-
-                # 5) Next URL?
-                parsed = submit_res["parsed"]
-                next_url = None
+            record["next_url"] = next_url
 
-                if isinstance(parsed, dict):
-                    next_url = parsed.get("url")
+        except Exception as e:
+            record["error"] = str(e)
 
-                    # If nested JSON in a string
-                    if isinstance(next_url, str) and next_url.startswith("{"):
-                        try:
-                            nested = json.loads(next_url)
-                            next_url = nested.get("url")
-                        except Exception:
-                            pass
+    return record
 
-                record["next_url"] = next_url
-                steps.append(record)
 
-                if not next_url:
+async def solve_quiz(email: str, secret: str, url: str, required_min_steps: int = 3, max_steps: int = MAX_CHAIN_STEPS) -> Dict[str, Any]:
+    steps: List[Dict[str, Any]] = []
+    pending = [url]
+    step_no = 0
+    all_ok = True
+    sem = asyncio.Semaphore(STEP_CONCURRENCY)
+
+    # HTTP/2 + keep-alive pool: the repeated GETs/POSTs against the quiz and
+    # submit hosts multiplex over a few long-lived connections
+    async with httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(DEFAULT_HTTP_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=64,
+            max_keepalive_connections=32,
+            keepalive_expiry=30.0
+        ),
+        headers={"User-Agent": "tds-solver/1.0"}
+    ) as client:
+        while pending and step_no < max_steps:
+            # Solve all currently-known URLs in parallel (bounded by sem);
+            # the usual single-url chain degenerates to one step per round
+            batch = pending[:max_steps - step_no]
+            records = await asyncio.gather(*[
+                _do_step(u, step_no + 1 + i, email, secret, client, sem)
+                for i, u in enumerate(batch)
+            ])
+            step_no += len(batch)
+            steps.extend(records)
+
+            # Tally success as we go: a network error or any submit >= 400
+            # marks the chain, no final rescan of steps needed
+            pending = []
+            had_error = False
+            delay = 0.0
+            for record in records:
+                if record.get("error"):
+                    had_error = True
+                    all_ok = False
                     break
-
-                current_url = next_url
-                await asyncio.sleep(0.2)
-
-            except Exception as e:
-                record["error"] = str(e)
-                steps.append(record)
+                all_ok &= record["submit_status"] < 400
+                next_url = record.get("next_url")
+                if isinstance(next_url, list):
+                    pending.extend(u for u in next_url if u)
+                elif next_url:
+                    pending.append(next_url)
+                delay = max(delay, record.get("retry_after", 0.0))
+
+            if had_error:
                 break
 
+            # No fixed politeness sleep: only back off when the server sent
+            # a 429 with Retry-After
+            if pending and delay > 0:
+                await asyncio.sleep(delay)
+
         total = len(steps)
-        success = all(s.get("submit_status", 500) < 400 for s in steps)
 
         return {
-            "result": "chain_completed" if success else "chain_with_errors",
+            "result": "chain_completed" if all_ok else "chain_with_errors",
             "steps_done": total,
             "meets_required_steps": total >= required_min_steps,
             "steps": steps